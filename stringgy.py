@@ -40,14 +40,15 @@ INTERACTIVE EDIT (DEFAULT when you don’t pass --replace)
     # or explicitly:
     python stringgy.py --input programtool.exe --search example.com --interactive
 
-BATCH REPLACE (non-interactive selection; still shows per-write preview/confirm)
+BATCH REPLACE (non-interactive: the selection / "Replace ALL?" is the confirmation)
 Replace ALL matches with the same string and chosen mode:
     python stringgy.py --input programtool.exe --search example.com \
         --replace example.org --mode exact --all --yes
 Notes:
   - `--mode` is required in batch: exact | padnul | padspace | truncate
-  - `--yes` auto-confirms the “Replace ALL?” prompt, but each write still shows
-    a preview and asks to confirm (by design, to prevent accidental mass edits).
+  - `--yes` auto-confirms the “Replace ALL?” prompt. Batch writes are applied
+    together with a single flush and then verified; for a per-write preview
+    and [y/N], use the interactive editor instead.
 Replace a subset (you’ll be prompted to enter indices like "1,3-5"):
     python stringgy.py --input programtool.exe --search example.com \
         --replace example.org --mode padspace
@@ -58,8 +59,8 @@ SAFETY NOTES (read this)
   If you aren’t sure, use same-length replacements (mode: exact).
 - `padspace` adds trailing spaces to fill the gap. That may break URLs or
   signatures if the consumer doesn’t trim. You’ll see the preview before writing.
-- Verification: after each write, the script re-reads the file and confirms the
-  exact bytes at that offset match what was intended. If verification fails, it
+- Verification: after each write, the script reads the bytes back (through the
+  same open file) and confirms they match what was intended at that offset. If verification fails, it
   warns you immediately.
 - Backups: always created with a timestamped name; if one exists for that
   second, a numeric suffix is added. Keep these if you need to roll back.
@@ -87,10 +88,14 @@ Also search UTF-16BE and ignore case:
     python stringgy.py --input programtool.exe --search ExAmPlE.CoM --utf16be --ignore-case
 """
 
-import argparse, mmap, os, sys, re, shutil, time
-from typing import Optional
+import argparse, heapq, itertools, mmap, os, sys, shutil, time
+from typing import Optional, Tuple
 from colorama import init, Fore, Style
 init(autoreset=True)
+try:
+    import fcntl  # POSIX only; used for the FICLONE backup clone
+except ImportError:
+    fcntl = None
 
 # ---- Splash (clears → shows → waits 2s → clears) ----
 try:
@@ -129,135 +134,218 @@ except Exception:
         os.system("cls" if os.name == "nt" else "clear")
 
 PRINTABLE_UTF8 = set(range(0x20, 0x7F)) | {0x09, 0x0A, 0x0D}
-
-def find_all(hay: bytes, needle: bytes, step: int = 1):
-    if not needle: return
-    i = 0
+# hit["enc"] -> Python codec name
+CODEC = {"utf-8": "utf-8", "utf-16le": "utf-16-le", "utf-16be": "utf-16-be"}
+
+# mmap.find only switched to stringlib's fast search in 3.11 (bpo-46848); before
+# that it is a naive byte loop, so older interpreters search copied windows
+# with bytes.find instead.
+MMAP_FASTSEARCH = sys.version_info >= (3, 11)
+SCAN_WINDOW = 1 << 20  # 1 MiB blocks: stay cache-resident while every needle runs
+
+def strict_units(needle: bytes, be: bool):
+    # (offset, unit) for each non-ASCII UTF-16 unit of a needle that contains an
+    # A-Z/a-z byte: byte-wise folding can confuse those, so they must match the
+    # file exactly. Empty for ASCII needles, which then need no re-check.
+    out = []
+    for k in range(0, len(needle) - 1, 2):
+        u = needle[k:k+2]
+        if (u[0] if be else u[1]) and u.lower() != u.upper():
+            out.append((k, u))
+    return tuple(out)
+
+def _block_hits(buf, needle: bytes, k: int, step: int, i: int, end: int, origin: int):
+    # Lazily yield (origin + j, k) for each hit of needle starting in buf[i:end].
+    # ASCII terms in UTF-16LE end in a 0x00 byte, which is everywhere in
+    # binaries (and in UTF-16 text) and defeats find's last-byte skip.
+    # Search without trailing NULs and check them per candidate instead, unless
+    # that leaves a single byte: a 1-byte find hits far too often to pay off.
+    core = needle.rstrip(b"\0")
+    if len(core) < 2: core = needle
+    tail = needle[len(core):]; lc = len(core)
     while True:
-        i = hay.find(needle, i)
-        if i < 0: return
-        yield i
-        i += step
-
-def _is_printable_byte(b: int) -> bool:
-    return b in PRINTABLE_UTF8
+        j = buf.find(core, i, end - len(tail))
+        if j < 0: return
+        if (step == 2 and (j + origin) & 1) or (tail and buf[j+lc:j+lc+len(tail)] != tail):
+            i = j + 1; continue
+        yield j + origin, k
+        i = j + step
+
+def find_many(hay, needles, steps, fold: bool = False):
+    # Yield (k, offset) for every hit of needles[k], in offset order, from a
+    # single pass over hay: each SCAN_WINDOW block is searched for all needles
+    # while it is still in cache, rather than streaming the file once per needle.
+    # steps[k]=2 is used for UTF-16: only code-unit aligned (even) offsets count.
+    # fold=True lowercases each block (ASCII only, offsets unchanged) first, so
+    # needles must already be lowercased.
+    L = len(hay); pad = max(map(len, needles)) - 1
+    direct = not fold and (MMAP_FASTSEARCH or not isinstance(hay, mmap.mmap))
+    for base in range(0, L, SCAN_WINDOW):
+        limit = min(L, base + SCAN_WINDOW)
+        if direct:
+            buf, origin = hay, 0
+        else:
+            # Copied blocks overlap by `pad` so a match across a seam is seen.
+            buf, origin = hay[base:limit+pad], base
+            if fold: buf = buf.lower()
+        # Each needle's hits come out in offset order; merge them lazily so every
+        # hit reaches the caller (and its context scan) while the block is hot.
+        runs = [_block_hits(buf, needle, k, steps[k], base - origin,
+                            limit - origin + len(needle) - 1, origin)
+                for k, needle in enumerate(needles) if needle]
+        for off, k in heapq.merge(*runs):
+            yield k, off
 
 # ---------- Context expansion (and bounds helpers) ----------
+# Bounds are found a window at a time: bytes.translate maps each byte (or
+# UTF-16 code unit) to a class, then C-level find/rfind locate the first NUL
+# or run of non-printables instead of stepping through the map in Python.
+C_OK, C_BAD, C_NUL = 0, 1, 2
+CTX_WINDOW = 256        # first window; doubles each step up to CTX_WINDOW_MAX
+CTX_WINDOW_MAX = 1 << 20
+
+_U8_CLASS = bytes(C_NUL if b == 0 else C_OK if b in PRINTABLE_UTF8 else C_BAD for b in range(256))
+# UTF-16 units below 0x100 classed by their low byte (U+00A0..U+00FF printable);
+# units >= 0x100 are always printable.
+_U16_LOW_CLASS = bytes(C_NUL if b == 0 else C_OK if b in PRINTABLE_UTF8 or b >= 0xA0 else C_BAD for b in range(256))
+_ZERO_MASK = b"\xff" + bytes(255)  # 0x00 -> 0xFF, anything else -> 0x00
+
+def _classify_u16(win: bytes, be: bool) -> bytes:
+    n = len(win) // 2
+    lo, hi = (win[1::2], win[0::2]) if be else (win[0::2], win[1::2])
+    cls = lo[:n].translate(_U16_LOW_CLASS)
+    keep = hi[:n].translate(_ZERO_MASK)
+    # AND with the "high byte is zero" mask resets every unit >= 0x100 to
+    # C_OK in one big-int op rather than a per-unit loop.
+    return (int.from_bytes(cls, "big") & int.from_bytes(keep, "big")).to_bytes(n, "big")
+
+def _ctx_left(classify, start: int, unit: int, run: int) -> int:
+    # Walk left from start; stop after a NUL or before the run-th consecutive
+    # non-printable unit. Windows overlap by run-1 units so runs crossing a
+    # window edge are still seen.
+    nul = bytes([C_NUL]); bad = bytes([C_BAD]) * run
+    hi = start; size = CTX_WINDOW
+    while hi > 0:
+        lo = max(0, hi - size)
+        cls = classify(lo, min(start, hi + (run-1)*unit))
+        p = max(cls.rfind(nul), cls.rfind(bad))
+        if p >= 0: return lo + (p+1)*unit
+        hi = lo; size = min(size*2, CTX_WINDOW_MAX)
+    return 0
+
+def _ctx_right(classify, end: int, L: int, unit: int, run: int) -> int:
+    # Mirror of _ctx_left: the result points at the NUL or at the run-th
+    # non-printable unit (exclusive bound), or the last whole unit in the file.
+    nul = bytes([C_NUL]); bad = bytes([C_BAD]) * run
+    lo = end; size = CTX_WINDOW
+    while lo + unit <= L:
+        hi = lo + min(size, (L - lo) // unit * unit)
+        a = max(end, lo - (run-1)*unit)
+        cls = classify(a, hi)
+        n = cls.find(nul); b = cls.find(bad)
+        if b >= 0: b += run - 1
+        p = min(n, b) if n >= 0 and b >= 0 else max(n, b)
+        if p >= 0: return a + p*unit
+        lo = hi; size = min(size*2, CTX_WINDOW_MAX)
+    return lo
+
 def bounds_utf8(mm: mmap.mmap, start: int, end: int):
-    L = len(mm); left = start; right = end
-    bad_run = 0
-    while left > 0:
-        x = mm[left-1]
-        if x == 0x00: break
-        if not _is_printable_byte(x):
-            bad_run += 1
-            if bad_run >= 3: break
-        else: bad_run = 0
-        left -= 1
-    bad_run = 0
-    while right < L:
-        x = mm[right]
-        if x == 0x00: break
-        if not _is_printable_byte(x):
-            bad_run += 1
-            if bad_run >= 3: break
-        else: bad_run = 0
-        right += 1
-    return left, right
+    classify = lambda a, b: mm[a:b].translate(_U8_CLASS)
+    return _ctx_left(classify, start, 1, 3), _ctx_right(classify, end, len(mm), 1, 3)
 
 def _bounds_utf16(mm: mmap.mmap, start: int, end: int, be: bool):
-    L = len(mm); left = start; right = end
-    def get_u16(idx):
-        if idx < 0 or idx+1 >= L: return None
-        return (mm[idx]<<8 | mm[idx+1]) if be else (mm[idx] | (mm[idx+1]<<8))
-    if left % 2: left -= 1
-    if right % 2: right += 1
-    bad_run = 0
-    while left-2 >= 0:
-        code = get_u16(left-2)
-        if code is None or code == 0x0000: break
-        if 0x20 <= code <= 0x7E or code in (0x09,0x0A,0x0D) or (0xA0 <= code <= 0x10FFFF):
-            bad_run = 0
-        else:
-            bad_run += 1
-            if bad_run >= 2: break
-        left -= 2
-    bad_run = 0
-    while right+2 <= L:
-        code = get_u16(right)
-        if code is None or code == 0x0000: break
-        if 0x20 <= code <= 0x7E or code in (0x09,0x0A,0x0D) or (0xA0 <= code <= 0x10FFFF):
-            bad_run = 0; right += 2
-        else:
-            bad_run += 1
-            if bad_run >= 2: break
-            right += 2
-    return left, right
-
-def expand_full_utf8(mm: mmap.mmap, start: int, end: int) -> bytes:
-    l, r = bounds_utf8(mm, start, end)
-    return bytes(mm[l:r])
+    if start % 2: start -= 1
+    if end % 2: end += 1
+    classify = lambda a, b: _classify_u16(mm[a:b], be)
+    return _ctx_left(classify, start, 2, 2), _ctx_right(classify, end, len(mm), 2, 2)
 
-def expand_full_utf16le(mm: mmap.mmap, start: int, end: int) -> bytes:
-    l, r = _bounds_utf16(mm, start, end, be=False)
-    return bytes(mm[l:r])
-
-def expand_full_utf16be(mm: mmap.mmap, start: int, end: int) -> bytes:
-    l, r = _bounds_utf16(mm, start, end, be=True)
-    return bytes(mm[l:r])
+def all_printable(t: bytes, enc: str) -> bool:
+    cls = t.translate(_U8_CLASS) if enc == "utf-8" else _classify_u16(t, be=(enc == "utf-16be"))
+    return cls.count(C_OK) == len(cls)
 
 # ---------- UI helpers ----------
 from colorama import init as _dummy  # keep colorama import alive for packaging
+# A-Z -> a-z only, like the search's byte folding; keeps string length (and
+# so indices) intact, which str.lower() does not for every character.
+_ASCII_FOLD = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
 def color_highlight(text: str, needle: str, ignore_case: bool) -> str:
-    flags = re.IGNORECASE if ignore_case else 0
-    pattern = re.compile(re.escape(needle), flags)
-    return pattern.sub(lambda m: Fore.YELLOW + Style.BRIGHT + m.group(0) + Style.RESET_ALL, text)
+    if not needle: return text
+    hay = text.translate(_ASCII_FOLD) if ignore_case else text
+    ndl = needle.translate(_ASCII_FOLD) if ignore_case else needle
+    parts = []; i = 0; n = len(ndl)
+    while True:
+        j = hay.find(ndl, i)
+        if j < 0: break
+        parts.append(text[i:j]); parts.append(Fore.YELLOW + Style.BRIGHT + text[j:j+n] + Style.RESET_ALL)
+        i = j + n
+    parts.append(text[i:])
+    return "".join(parts)
 
 def decode_safe(b: bytes, encoding: str) -> str:
     try: return b.decode(encoding, errors="replace")
     except Exception: return repr(b)
 
 # ---------- Search ----------
-def search(path: str, term: str, include_utf16be: bool, ignore_case: bool):
-    results = []
-    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-        t8 = term.encode('utf-8')
-        t16le = term.encode('utf-16-le')
-        t16be = term.encode('utf-16-be') if include_utf16be else None
-        def find_ci(hay: bytes, needle: bytes, step: int):
-            n = len(needle); nl = needle.lower(); i = 0; L = len(hay)
-            while i <= L - n:
-                if hay[i:i+n].lower() == nl: yield i; i += step
-                else: i += step
-        # UTF-8
-        offs = list(find_ci(mm, t8, 1)) if ignore_case else list(find_all(mm, t8, 1))
-        for off in offs:
-            results.append({"offset": off, "enc": "utf-8",
-                            "match_bytes": bytes(mm[off:off+len(t8)]),
-                            "full_bytes": expand_full_utf8(mm, off, off+len(t8)),
-                            "term_bytes": t8})
-        # UTF-16LE
-        offs = list(find_ci(mm, t16le, 2)) if ignore_case else list(find_all(mm, t16le, 2))
-        for off in offs:
-            results.append({"offset": off, "enc": "utf-16le",
-                            "match_bytes": bytes(mm[off:off+len(t16le)]),
-                            "full_bytes": expand_full_utf16le(mm, off, off+len(t16le)),
-                            "term_bytes": t16le})
-        # UTF-16BE
-        if t16be:
-            offs = list(find_ci(mm, t16be, 2)) if ignore_case else list(find_all(mm, t16be, 2))
-            for off in offs:
-                results.append({"offset": off, "enc": "utf-16be",
-                                "match_bytes": bytes(mm[off:off+len(t16be)]),
-                                "full_bytes": expand_full_utf16be(mm, off, off+len(t16be)),
-                                "term_bytes": t16be})
-    return results
+def advise(mm: mmap.mmap, *names: str):
+    # madvise is missing on Windows (and before 3.8 or on some kernels); it is
+    # only a hint, so skip it there (or once the map is closed: ValueError).
+    try:
+        for name in names: mm.madvise(getattr(mmap, name))
+    except (AttributeError, OSError, ValueError):
+        pass
+
+def search(mm: mmap.mmap, term: str, include_utf16be: bool, ignore_case: bool, readahead: bool = True):
+    # Generator: hits are yielded in offset order as the scan reaches them, so a
+    # caller that stops early (--limit) stops the scan too. Hits carry only the
+    # context bounds ("full_span"); slice the map when the context is shown.
+
+    # One front-to-back pass follows: ask for big readahead windows, and for the
+    # whole file up front unless the caller may stop early (readahead=False).
+    advise(mm, "MADV_SEQUENTIAL", *(("MADV_WILLNEED",) if readahead else ()))
+    t8 = term.encode('utf-8')
+    t16le = term.encode('utf-16-le')
+    t16be = term.encode('utf-16-be') if include_utf16be else None
+    # Byte-wise folding is exact for ASCII terms (the high byte of every UTF-16
+    # unit is 0). For other terms a unit like U+0141 (41 01) also folds onto
+    # U+0161 (61 01), so those units are re-checked against the file.
+    encs = [("utf-8", t8, 1, (), bounds_utf8),
+            ("utf-16le", t16le, 2, strict_units(t16le, be=False),
+             lambda mm, s, e: _bounds_utf16(mm, s, e, be=False))]
+    if t16be:
+        encs.append(("utf-16be", t16be, 2, strict_units(t16be, be=True),
+                     lambda mm, s, e: _bounds_utf16(mm, s, e, be=True)))
+    # Hits come in offset order, and neighbours often sit in the same string.
+    # If the needle is all printable it can neither end a string nor split a
+    # non-printable run, so a hit inside the previous hit's span (same
+    # encoding) has exactly that span: reuse it instead of rescanning.
+    reuse = [all_printable(t, enc) for enc, t, _, _, _ in encs]
+    spans = {}
+    # Case-insensitive: fold each needle once here and each block of the file
+    # as it is scanned. bytes.lower() only touches A-Z, so offsets are unchanged.
+    needles = [t.lower() if ignore_case else t for _, t, _, _, _ in encs]
+    try:
+        for k, off in find_many(mm, needles, [e[2] for e in encs], fold=ignore_case):
+            enc, t, _, strict, bounds = encs[k]
+            if ignore_case and strict and not all(mm[off+i:off+i+2] == u for i, u in strict):
+                continue
+            end = off + len(t); span = spans.get(enc)
+            if not (reuse[k] and span and span[0] <= off and end <= span[1]):
+                span = spans[enc] = bounds(mm, off, end)
+            yield {"offset": off, "enc": enc,
+                   "match_bytes": bytes(mm[off:end]),
+                   "full_span": span,
+                   "term_bytes": t}
+    finally:
+        # The scan is over (finished or closed early); the map now serves
+        # scattered context/preview/verify reads, where sequential readahead
+        # and eager page dropping only get in the way.
+        advise(mm, "MADV_NORMAL")
 
 def encode_by_enc(s: str, enc: str) -> bytes:
-    if enc == "utf-8": return s.encode("utf-8")
-    if enc == "utf-16le": return s.encode("utf-16-le")
-    if enc == "utf-16be": return s.encode("utf-16-be")
-    raise ValueError("unknown encoding")
+    codec = CODEC.get(enc)
+    if codec is None: raise ValueError("unknown encoding")
+    return s.encode(codec)
 
 def pad_bytes(enc: str, pad_char: str, nbytes: int) -> bytes:
     if not pad_char or len(pad_char) != 1:
@@ -268,17 +356,20 @@ def pad_bytes(enc: str, pad_char: str, nbytes: int) -> bytes:
         raise ValueError(f"pad gap {nbytes} is not a multiple of encoded pad length {ulen}")
     return unit * (nbytes // ulen)
 
-def fmt_and_show_hits(hits, needle, ignore_case):
+def hit_context(mm: mmap.mmap, hit) -> str:
+    l, r = hit["full_span"]
+    return decode_safe(mm[l:r], CODEC[hit["enc"]])
+
+def fmt_and_show_hits(session, hits, needle, ignore_case):
     if not hits:
         print(Fore.YELLOW + "No matches found." + Style.RESET_ALL); return
-    hits.sort(key=lambda h: h["offset"])
     for idx, h in enumerate(hits, 1):
         off = h["offset"]; enc = h["enc"]
-        exact = h["match_bytes"]; full = h["full_bytes"]
+        exact = h["match_bytes"]
         print(Fore.CYAN + f"[{idx}] Match at 0x{off:08X} ({off})" + Style.RESET_ALL)
         print(f"  Encoding   : {Fore.GREEN}{enc}{Style.RESET_ALL}")
         print(f"  Exact bytes: {Fore.MAGENTA}{exact!r}{Style.RESET_ALL}")
-        ctx = decode_safe(full, "utf-8" if enc=="utf-8" else ("utf-16-le" if enc=="utf-16le" else "utf-16-be"))
+        ctx = hit_context(session.mm, h)
         print("  Context    : " + color_highlight(ctx, needle, ignore_case)); print()
 
 # ---------- Backups (timestamp + numeric suffix) ----------
@@ -293,15 +384,108 @@ def unique_backup_name(path: str) -> str:
             return cand
         n += 1
 
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+def clone_file(src: str, dst: str) -> bool:
+    # Cheap backup where the OS can do it: a copy-on-write clone (btrfs, XFS
+    # reflink, ...) is O(1) regardless of size; copy_file_range keeps the copy
+    # in-kernel and may itself become a reflink or server-side copy.
+    # Returns False when neither applies; the caller then does a plain copy.
+    try:
+        with open(src, 'rb') as fs, open(dst, 'xb') as fd:
+            # FICLONE's number is Linux's; elsewhere it could mean another ioctl.
+            if fcntl is not None and sys.platform.startswith("linux"):
+                try:
+                    fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+                    return True
+                except OSError:
+                    pass
+            if not hasattr(os, "copy_file_range"):
+                return False
+            left = os.fstat(fs.fileno()).st_size
+            while left > 0:
+                n = os.copy_file_range(fs.fileno(), fd.fileno(), left)
+                if n == 0: return False
+                left -= n
+            return True
+    except OSError:
+        return False
+
 def ensure_backup(path):
     bak = unique_backup_name(path)
-    shutil.copy2(path, bak)
+    if clone_file(path, bak):
+        shutil.copystat(path, bak)
+    else:
+        shutil.copy2(path, bak)
     print(Fore.WHITE + f"Backup created: {bak}" + Style.RESET_ALL)
     return bak
 
+# ---------- Edit session ----------
+HAVE_PWRITE = hasattr(os, "pwrite")
+
+# One mapping of the target, shared by every read of a run (search, listing,
+# previews, verifies). It starts read-only and is only reopened r+b on the
+# first write, so listing a read-only file (or quitting the editor without
+# writing) never needs write access.
+class Session:
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = False
+        self.f, self.mm = self._open(writable)
+        self.writable = writable
+
+    def _open(self, writable: bool):
+        f = open(self.path, "r+b" if writable else "rb")
+        try:
+            return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except Exception:
+            f.close(); raise
+
+    def make_writable(self):
+        # Raises OSError (e.g. PermissionError) if the file can't be opened r+b;
+        # the read-only handle stays usable in that case.
+        if self.writable: return
+        f, mm = self._open(True)
+        self.close()
+        self.f, self.mm, self.writable = f, mm, True
+
+    def flush(self, off: int, n: int):
+        # msync only the touched pages; the start must be granularity-aligned.
+        start = off - off % mmap.ALLOCATIONGRANULARITY
+        self.mm.flush(start, off + n - start)
+
+    # Single-span edits go through pwrite/pread on the same descriptor: one
+    # syscall and one page, no msync of the mapping. The map sees the change
+    # through the shared page cache. Windows has no pwrite, so it writes via
+    # the map instead.
+    def write(self, off: int, data: bytes):
+        self.make_writable()
+        if HAVE_PWRITE:
+            fd = self.f.fileno()
+            os.pwrite(fd, data, off); os.fsync(fd)
+        else:
+            self.mm[off:off+len(data)] = data
+            self.flush(off, len(data))
+
+    def read(self, off: int, n: int) -> bytes:
+        if HAVE_PWRITE:
+            return os.pread(self.f.fileno(), n, off)
+        return self.mm[off:off+n]
+
+    def close(self):
+        try: self.mm.close()
+        finally: self.f.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
 # ---------- Write + preview + verify ----------
-def adjusted_write_bytes(enc: str, new_str: str, old_len: int, mode: str, pad_char: str = ' ') -> Optional[bytes]:
+def adjusted_write_bytes(enc: str, new_str: str, old_len: int, mode: str, pad_char: str = ' ') -> Tuple[Optional[bytes], bytes]:
+    # -> (bytes to write or None if incompatible, new_str encoded as-is)
     nb = encode_by_enc(new_str, enc)
+    return fit_bytes(enc, nb, old_len, mode, pad_char), nb
+
+def fit_bytes(enc: str, nb: bytes, old_len: int, mode: str, pad_char: str = ' ') -> Optional[bytes]:
     if len(nb) == old_len:
         return nb
     if mode == "padnul" and len(nb) < old_len:
@@ -319,47 +503,38 @@ def adjusted_write_bytes(enc: str, new_str: str, old_len: int, mode: str, pad_ch
         return None
     return None
 
-def build_preview_text(path, hit, written_bytes):
+def build_preview_text(session, hit, written_bytes):
     enc = hit["enc"]; off = hit["offset"]; old_len = len(hit["term_bytes"])
-    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-        if enc == "utf-8":
-            l, r = bounds_utf8(mm, off, off+old_len)
-            preview_bytes = bytes(mm[l:off]) + written_bytes + bytes(mm[off+old_len:r])
-            dec = 'utf-8'
-        elif enc == "utf-16le":
-            l, r = _bounds_utf16(mm, off, off+old_len, be=False)
-            preview_bytes = bytes(mm[l:off]) + written_bytes + bytes(mm[off+old_len:r])
-            dec = 'utf-16-le'
-        else:
-            l, r = _bounds_utf16(mm, off, off+old_len, be=True)
-            preview_bytes = bytes(mm[l:off]) + written_bytes + bytes(mm[off+old_len:r])
-            dec = 'utf-16-be'
-    return decode_safe(preview_bytes, dec)
-
-def verify_bytes(path, off, expected: bytes) -> bool:
-    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-        return mm[off:off+len(expected)] == expected
+    mm = session.mm
+    if enc == "utf-8":
+        l, r = bounds_utf8(mm, off, off+old_len)
+    else:
+        l, r = _bounds_utf16(mm, off, off+old_len, be=(enc == "utf-16be"))
+    preview_bytes = bytes(mm[l:off]) + written_bytes + bytes(mm[off+old_len:r])
+    return decode_safe(preview_bytes, CODEC[enc])
 
-def write_one(path, hit, new_str, mode, pad_char=' '):
+def write_one(session, hit, new_str, mode, pad_char=' '):
     enc = hit["enc"]; off = hit["offset"]; old_len = len(hit["term_bytes"])
-    eff = adjusted_write_bytes(enc, new_str, old_len, mode, pad_char)
+    eff, nb = adjusted_write_bytes(enc, new_str, old_len, mode, pad_char)
     if eff is None:
         print(Fore.RED + f"Cannot write @ 0x{off:08X}: incompatible lengths for mode '{mode}'." + Style.RESET_ALL)
         return False
-    old_ctx = decode_safe(hit["full_bytes"], "utf-8" if enc=="utf-8" else ("utf-16-le" if enc=="utf-16le" else "utf-16-be"))
-    new_ctx = build_preview_text(path, hit, eff)
+    old_ctx = hit_context(session.mm, hit)
+    new_ctx = build_preview_text(session, hit, eff)
     print(Fore.BLUE + "— EDIT REVIEW —" + Style.RESET_ALL)
     print("Old context : " + old_ctx)
-    print(Fore.YELLOW + f"Mode={mode} | old_len={old_len} | new_in_len={len(encode_by_enc(new_str, enc))} | write_len={len(eff)}" + Style.RESET_ALL)
+    print(Fore.YELLOW + f"Mode={mode} | old_len={old_len} | new_in_len={len(nb)} | write_len={len(eff)}" + Style.RESET_ALL)
     print("Preview     : " + new_ctx)
     confirm = input(Fore.YELLOW + "Write this change? [y/N]: " + Style.RESET_ALL).strip().lower()
     if confirm not in ("y","yes"):
         print("Skipped.")
         return False
-    with open(path, "r+b") as f, mmap.mmap(f.fileno(), 0) as mm:
-        mm[off:off+old_len] = eff
-        mm.flush()
-    ok = verify_bytes(path, off, eff)
+    try:
+        session.write(off, eff)
+    except OSError as e:
+        print(Fore.RED + f"Cannot write @ 0x{off:08X}: {e}" + Style.RESET_ALL)
+        return False
+    ok = session.read(off, len(eff)) == eff
     if ok:
         print(Fore.GREEN + f"OK: verified bytes @ 0x{off:08X}" + Style.RESET_ALL)
     else:
@@ -367,10 +542,10 @@ def write_one(path, hit, new_str, mode, pad_char=' '):
     return ok
 
 # ---------- Interactive loop ----------
-def interactive_loop(path, hits, search_str, ignore_case, default_mode="exact", default_pad_char=' '):
+def interactive_loop(session, hits, search_str, ignore_case, default_mode="exact", default_pad_char=' '):
     if not hits:
         print(Fore.YELLOW + "No matches to edit." + Style.RESET_ALL); return
-    ensure_backup(path)
+    ensure_backup(session.path)
     while True:
         sel = input(Fore.CYAN + "Edit which index? (e.g., 69, 'all', or 'q' to quit): " + Style.RESET_ALL).strip().lower()
         if sel in ("q","quit","exit"): break
@@ -386,7 +561,7 @@ def interactive_loop(path, hits, search_str, ignore_case, default_mode="exact",
                 if tmp: pad_char = tmp[0]
             wrote = 0
             for h in hits:
-                wrote += 1 if write_one(path, h, new_str, mode, pad_char=pad_char) else 0
+                wrote += 1 if write_one(session, h, new_str, mode, pad_char=pad_char) else 0
             print(Fore.WHITE + Style.BRIGHT + f"Done. Replacements written: {wrote}/{len(hits)}" + Style.RESET_ALL)
             continue
 
@@ -398,8 +573,8 @@ def interactive_loop(path, hits, search_str, ignore_case, default_mode="exact",
             print("Out of range."); continue
 
         h = hits[i-1]
-        enc = h["enc"]; off = h["offset"]; full = h["full_bytes"]
-        ctx = decode_safe(full, "utf-8" if enc=="utf-8" else ("utf-16-le" if enc=="utf-16le" else "utf-16-be"))
+        enc = h["enc"]; off = h["offset"]
+        ctx = hit_context(session.mm, h)
         print(Fore.CYAN + f"[{i}] Editing 0x{off:08X}  enc={enc}" + Style.RESET_ALL)
         print("OLD Context: " + color_highlight(ctx, search_str, ignore_case))
         print(f"Exact bytes: {Fore.MAGENTA}{h['match_bytes']!r}{Style.RESET_ALL}")
@@ -413,35 +588,66 @@ def interactive_loop(path, hits, search_str, ignore_case, default_mode="exact",
         old_len = len(h["term_bytes"])
 
         if in_len == old_len:
-            write_one(path, h, new_str, "exact")
+            write_one(session, h, new_str, "exact")
         elif in_len < old_len:
             print(Fore.YELLOW + f"Shorter by {old_len - in_len} byte(s). Choose pad mode." + Style.RESET_ALL)
             print("  [N] Pad with NULs   [S] Pad with spaces/custom   [E] Exact (skip)")
             ch = input("Mode (N/S/E)? ").strip().lower()
             if ch == "n":
-                write_one(path, h, new_str, "padnul")
+                write_one(session, h, new_str, "padnul")
             elif ch == "s":
                 tmp = input("Pad char (single char, default space): ").strip()
                 pad_char = tmp[0] if tmp else ' '
-                write_one(path, h, new_str, "padspace", pad_char=pad_char)
+                write_one(session, h, new_str, "padspace", pad_char=pad_char)
             else:
                 print("Skipped.")
         else:
             print(Fore.YELLOW + f"Longer by {in_len - old_len} byte(s). Options: [T]runcate or [E]xact (skip)" + Style.RESET_ALL)
             ch = input("Mode (T/E)? ").strip().lower()
             if ch == "t":
-                write_one(path, h, new_str, "truncate")
+                write_one(session, h, new_str, "truncate")
             else:
                 print("Skipped.")
 
 # ---------- Batch helper ----------
-def replace_batch(path, hits, new_str, indices, mode, pad_char=' '):
+def replace_batch(session, hits, new_str, indices, mode, pad_char=' '):
+    # The index selection / "Replace ALL?" prompt already confirmed these, so
+    # apply every edit to the shared map, flush once (one msync instead of one
+    # per hit), then read each span back from that same map to verify it.
+    # Hits can overlap (aa in aaa); later edits then overwrite earlier ones, so
+    # each span is checked against the bytes expected after *all* edits.
     if not hits or not indices: return 0
-    ensure_backup(path)
-    written = 0
+    try:
+        session.make_writable()
+    except OSError as e:
+        print(Fore.RED + f"Cannot open '{session.path}' for writing: {e}" + Style.RESET_ALL)
+        return 0
+    ensure_backup(session.path)
+    edits = []; fitted = {}  # (enc, old_len) -> bytes to write; same for every hit
     for i in sorted(indices):
-        h = hits[i-1]
-        if write_one(path, h, new_str, mode, pad_char=pad_char): written += 1
+        h = hits[i-1]; off = h["offset"]
+        key = (h["enc"], len(h["term_bytes"]))
+        if key not in fitted:
+            fitted[key] = adjusted_write_bytes(key[0], new_str, key[1], mode, pad_char)[0]
+        eff = fitted[key]
+        if eff is None:
+            print(Fore.RED + f"Cannot write @ 0x{off:08X}: incompatible lengths for mode '{mode}'." + Style.RESET_ALL)
+            continue
+        edits.append((off, eff))
+    if not edits: return 0
+    for off, eff in edits:
+        session.mm[off:off+len(eff)] = eff
+    session.mm.flush()
+    written = 0
+    for n, (off, eff) in enumerate(edits):
+        want = bytearray(eff); end = off + len(eff); m = n + 1
+        while m < len(edits) and edits[m][0] < end:  # sorted: only later ones overlap
+            o2, e2 = edits[m]; want[o2-off:o2-off+len(e2)] = e2[:end-o2]; m += 1
+        if session.mm[off:end] == want:
+            written += 1
+            print(Fore.GREEN + f"OK: verified bytes @ 0x{off:08X}" + Style.RESET_ALL)
+        else:
+            print(Fore.RED + f"WARNING: verify failed @ 0x{off:08X}" + Style.RESET_ALL)
     return written
 
 def parse_selection(sel_text, count):
@@ -488,37 +694,40 @@ def main():
     if not os.path.isfile(path):
         print(f"{Fore.RED}Error: '{path}' not found.{Style.RESET_ALL}"); sys.exit(1)
 
-    hits = search(path, args.search, args.utf16be, args.ignore_case)
-    if args.limit and args.limit > 0 and len(hits) > args.limit:
-        hits = sorted(hits, key=lambda h: h["offset"])[:args.limit]
-
-    fmt_and_show_hits(hits, args.search, args.ignore_case)
-    if not hits: return
-
-    # Batch mode
-    if args.replace:
-        if not (args.mode):
-            print(Fore.RED + "Specify --mode exact|padnul|padspace|truncate for batch replacement." + Style.RESET_ALL)
-            return
-        if args.all:
-            if not args.yes:
-                confirm = input(Fore.YELLOW + f"Replace ALL {len(hits)} matches with '{args.replace}' using [{args.mode}]? [y/N]: " + Style.RESET_ALL).strip().lower()
-                if confirm not in ("y","yes"): print("Aborted."); return
-            wrote = replace_batch(path, hits, args.replace, list(range(1, len(hits)+1)), args.mode, pad_char=args.pad_char[:1])
-            print(Fore.WHITE + Style.BRIGHT + f"Replacements written: {wrote}/{len(hits)}" + Style.RESET_ALL)
-        else:
-            if args.yes:
-                print(Fore.RED + "Batch mode without --all does nothing with --yes. Use --interactive or provide indices." + Style.RESET_ALL)
+    # Hits arrive in offset order, so --limit can stop the scan after N of them.
+    limit = args.limit if args.limit and args.limit > 0 else None
+    # One Session for the whole run: the search map also serves listing, previews
+    # and verifies, and only becomes r+b if something is actually written.
+    with Session(path) as session:
+        found = search(session.mm, args.search, args.utf16be, args.ignore_case, readahead=limit is None)
+        hits = list(itertools.islice(found, limit)); found.close()
+        fmt_and_show_hits(session, hits, args.search, args.ignore_case)
+        if not hits: return
+
+        # Batch mode
+        if args.replace:
+            if not (args.mode):
+                print(Fore.RED + "Specify --mode exact|padnul|padspace|truncate for batch replacement." + Style.RESET_ALL)
                 return
-            sel = input(Fore.CYAN + f"Select match indices to replace (e.g., 1,3-5 or 'all'): " + Style.RESET_ALL)
-            idxs = parse_selection(sel, len(hits))
-            if not idxs: print("No valid selection. Aborted."); return
-            wrote = replace_batch(path, hits, args.replace, idxs, args.mode, pad_char=args.pad_char[:1])
-            print(Fore.WHITE + Style.BRIGHT + f"Replacements written: {wrote}/{len(idxs)}" + Style.RESET_ALL)
-        return
-
-    # Interactive
-    interactive_loop(path, hits, args.search, args.ignore_case)
+            if args.all:
+                if not args.yes:
+                    confirm = input(Fore.YELLOW + f"Replace ALL {len(hits)} matches with '{args.replace}' using [{args.mode}]? [y/N]: " + Style.RESET_ALL).strip().lower()
+                    if confirm not in ("y","yes"): print("Aborted."); return
+                wrote = replace_batch(session, hits, args.replace, list(range(1, len(hits)+1)), args.mode, pad_char=args.pad_char[:1])
+                print(Fore.WHITE + Style.BRIGHT + f"Replacements written: {wrote}/{len(hits)}" + Style.RESET_ALL)
+            else:
+                if args.yes:
+                    print(Fore.RED + "Batch mode without --all does nothing with --yes. Use --interactive or provide indices." + Style.RESET_ALL)
+                    return
+                sel = input(Fore.CYAN + f"Select match indices to replace (e.g., 1,3-5 or 'all'): " + Style.RESET_ALL)
+                idxs = parse_selection(sel, len(hits))
+                if not idxs: print("No valid selection. Aborted."); return
+                wrote = replace_batch(session, hits, args.replace, idxs, args.mode, pad_char=args.pad_char[:1])
+                print(Fore.WHITE + Style.BRIGHT + f"Replacements written: {wrote}/{len(idxs)}" + Style.RESET_ALL)
+            return
+
+        # Interactive
+        interactive_loop(session, hits, args.search, args.ignore_case)
 
 if __name__ == "__main__":
     main()
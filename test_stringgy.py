@@ -0,0 +1,154 @@
+import builtins, sys
+
+import pytest
+
+pytest.importorskip("colorama")
+import stringgy
+
+DATA = b"\x00hello example.com world\x00"
+
+def run_main(monkeypatch, target, answers):
+    # Simulate a file that can be read but not opened for writing (immutable,
+    # read-only mount, running .exe on Windows).
+    real_open = builtins.open
+    def guarded_open(file, mode="r", *a, **k):
+        if str(file) == str(target) and any(c in mode for c in "wax+"):
+            raise PermissionError(1, "Operation not permitted", str(file))
+        return real_open(file, mode, *a, **k)
+    answers = iter(answers)
+    monkeypatch.setattr(builtins, "open", guarded_open)
+    monkeypatch.setattr(builtins, "input", lambda prompt="": next(answers))
+    monkeypatch.setattr(stringgy, "show_splash", lambda: None)
+    monkeypatch.setattr(sys, "argv", ["stringgy.py", "--input", str(target), "--search", "example.com"])
+    stringgy.main()
+
+def test_list_and_quit_on_read_only_file(tmp_path, monkeypatch, capsys):
+    target = tmp_path / "ro.bin"; target.write_bytes(DATA)
+    run_main(monkeypatch, target, ["q"])
+    out = capsys.readouterr().out
+    assert "Match at 0x00000007" in out
+    assert target.read_bytes() == DATA
+
+def test_edit_on_read_only_file_reports_error(tmp_path, monkeypatch, capsys):
+    target = tmp_path / "ro.bin"; target.write_bytes(DATA)
+    run_main(monkeypatch, target, ["1", "example.org", "y", "q"])
+    out = capsys.readouterr().out
+    assert "Cannot write @ 0x00000007" in out
+    assert target.read_bytes() == DATA
+
+# ---------- Scanner / bounds: equivalence with straightforward references ----------
+import mmap, random
+
+def brute_hits(hay, needles, steps, fold):
+    h = hay.lower() if fold else hay
+    return [(k, j) for j in range(len(h)) for k, n in enumerate(needles)
+            if n and h.startswith(n, j) and j % steps[k] == 0]
+
+# Trailing-NUL needles exercise the tail check, step 2 the even-offset rule.
+NEEDLES = [b"a", b"ab", b"a\x00", b"a\x00b\x00", b"\x00\x00", b"b\x00\x00", b"\x00"]
+STEPS = [1, 1, 1, 2, 2, 2, 1]
+
+@pytest.mark.parametrize("fastsearch", [True, False])
+@pytest.mark.parametrize("fold", [False, True])
+def test_find_many_matches_brute_force(tmp_path, monkeypatch, fastsearch, fold):
+    # Tiny blocks put hits across every seam; without fast search (or with
+    # fold) the copied-window path is taken instead of searching the map.
+    monkeypatch.setattr(stringgy, "SCAN_WINDOW", 7)
+    monkeypatch.setattr(stringgy, "MMAP_FASTSEARCH", fastsearch)
+    rnd = random.Random(1)
+    for _ in range(40):
+        data = bytes(rnd.choice(b"aAbB\x00\x01") for _ in range(rnd.randint(1, 120)))
+        target = tmp_path / "scan.bin"; target.write_bytes(data)
+        with open(target, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            got = list(stringgy.find_many(mm, NEEDLES, STEPS, fold=fold))
+        assert got == brute_hits(data, NEEDLES, STEPS, fold), data
+
+def test_ignore_case_rechecks_non_ascii_utf16_units(tmp_path):
+    # U+0141 (41 01) folds byte-wise onto U+0161 (61 01): only the real
+    # "ŁA" may match "Ła", not "šA".
+    data = "ŁA\0šA\0".encode("utf-16-le")
+    target = tmp_path / "strict.bin"; target.write_bytes(data)
+    with stringgy.Session(str(target)) as s:
+        hits = list(stringgy.search(s.mm, "Ła", False, True))
+    assert [(h["offset"], h["enc"]) for h in hits] == [(0, "utf-16le")]
+
+def ref_bounds_utf8(mm, start, end):
+    L = len(mm); left = start; right = end
+    bad_run = 0
+    while left > 0:
+        x = mm[left-1]
+        if x == 0x00: break
+        if x not in stringgy.PRINTABLE_UTF8:
+            bad_run += 1
+            if bad_run >= 3: break
+        else: bad_run = 0
+        left -= 1
+    bad_run = 0
+    while right < L:
+        x = mm[right]
+        if x == 0x00: break
+        if x not in stringgy.PRINTABLE_UTF8:
+            bad_run += 1
+            if bad_run >= 3: break
+        else: bad_run = 0
+        right += 1
+    return left, right
+
+def ref_unit_class(code):
+    if code == 0: return stringgy.C_NUL
+    if 0x20 <= code <= 0x7E or code in (0x09, 0x0A, 0x0D) or code >= 0xA0: return stringgy.C_OK
+    return stringgy.C_BAD
+
+def ref_bounds_utf16(mm, start, end, be):
+    L = len(mm); left = start - start % 2; right = end + end % 2
+    unit = lambda i: int.from_bytes(mm[i:i+2], "big" if be else "little")
+    bad_run = 0
+    while left >= 2:
+        c = ref_unit_class(unit(left-2))
+        if c == stringgy.C_NUL: break
+        if c == stringgy.C_BAD:
+            bad_run += 1
+            if bad_run >= 2: break
+        else: bad_run = 0
+        left -= 2
+    bad_run = 0
+    while right + 2 <= L:
+        c = ref_unit_class(unit(right))
+        if c == stringgy.C_NUL: break
+        if c == stringgy.C_BAD:
+            bad_run += 1
+            if bad_run >= 2: break
+        else: bad_run = 0
+        right += 2
+    return left, right
+
+@pytest.mark.parametrize("be", [False, True])
+def test_classify_u16_known_units(be):
+    units = [0x0000, 0x0041, 0x0009, 0x0001, 0x007F, 0x0080, 0x00A0, 0x00FF, 0x0100, 0x4100, 0xFF00, 0x0141]
+    win = b"".join(u.to_bytes(2, "big" if be else "little") for u in units) + b"\x41"  # odd tail byte ignored
+    assert stringgy._classify_u16(win, be) == bytes(map(ref_unit_class, units))
+
+def test_bounds_match_reference(monkeypatch):
+    # Tiny, growing windows so runs and NULs land on every window edge.
+    monkeypatch.setattr(stringgy, "CTX_WINDOW", 2)
+    monkeypatch.setattr(stringgy, "CTX_WINDOW_MAX", 8)
+    rnd = random.Random(2)
+    for _ in range(400):
+        data = bytes(rnd.choice(b"ab \t\x00\x01\x02\x80\xa0\xff") for _ in range(rnd.randint(1, 80)))
+        start = rnd.randrange(len(data)); end = min(len(data), start + rnd.randint(0, 4))
+        assert stringgy.bounds_utf8(data, start, end) == ref_bounds_utf8(data, start, end), (data, start, end)
+        for be in (False, True):
+            assert stringgy._bounds_utf16(data, start, end, be) == ref_bounds_utf16(data, start, end, be), (data, start, end, be)
+
+def test_batch_replace_overlapping_hits_verify(tmp_path, monkeypatch, capsys):
+    # "aa" hits at 1 and 2 overlap; the second write overwrites part of the
+    # first, which must still verify against the final bytes.
+    target = tmp_path / "overlap.bin"; target.write_bytes(b"\x00aaa\x00")
+    monkeypatch.setattr(stringgy, "show_splash", lambda: None)
+    monkeypatch.setattr(sys, "argv", ["stringgy.py", "--input", str(target), "--search", "aa",
+                                      "--replace", "bc", "--mode", "exact", "--all", "--yes"])
+    stringgy.main()
+    out = capsys.readouterr().out
+    assert "verify failed" not in out
+    assert "Replacements written: 2/2" in out
+    assert target.read_bytes() == b"\x00bbc\x00"